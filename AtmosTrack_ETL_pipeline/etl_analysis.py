@@ -79,148 +79,222 @@ print(f"✅ Analysis completed. Plots saved to {ANALYSIS_DIR}")
 '''
 
 import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # headless; also runs in every plot worker process
 import matplotlib.pyplot as plt
 from dotenv import load_dotenv
 from supabase import create_client
 
-# -------------------------------------------------------------------
-# Load environment and connect
-# -------------------------------------------------------------------
-load_dotenv()
-
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise SystemExit("❌ Please set SUPABASE_URL and SUPABASE_KEY in .env")
-
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 # Output directories
 os.makedirs("data/processed", exist_ok=True)
 os.makedirs("plots", exist_ok=True)
 
-# -------------------------------------------------------------------
-# 1. Fetch data from Supabase
-# -------------------------------------------------------------------
-print("Fetching data from Supabase...")
-
-res = supabase.table("air_quality_data").select("*").execute()
-df = pd.DataFrame(res.data)
-
-print(f"Loaded {len(df)} rows for analysis.")
+PLOT_DPI = 150
+MAX_TREND_POINTS = 2000  # per city; longer series are stride-sampled
 
-# Ensure correct dtypes
-df["time"] = pd.to_datetime(df["time"], errors="coerce")
-numeric_cols = [
-    "pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide",
-    "sulphur_dioxide", "ozone", "uv_index", "severity_score", "hour"
-]
-
-for col in numeric_cols:
-    df[col] = pd.to_numeric(df[col], errors="coerce")
-
-# -------------------------------------------------------------------
-# 2. KPI METRICS
 # -------------------------------------------------------------------
-print("\nGenerating KPI metrics...")
-
-kpi_metrics = {}
-
-# A: City with highest average PM2.5
-kpi_metrics["city_highest_pm25"] = (
-    df.groupby("city")["pm2_5"].mean().idxmax()
-    if not df.empty else None
-)
-
-# B: City with highest severity score
-kpi_metrics["city_highest_severity"] = (
-    df.groupby("city")["severity_score"].mean().idxmax()
-    if not df.empty else None
-)
-
-# C: Risk percentage distribution
-risk_counts = df["risk_flag"].value_counts(normalize=True) * 100
-risk_distribution = risk_counts.to_dict()
-
-# D: Hour of day with worst AQI (pm2_5)
-kpi_metrics["worst_hour"] = (
-    df.groupby("hour")["pm2_5"].mean().idxmax()
-    if not df.empty else None
-)
-
-# Convert KPI to DataFrame
-kpi_df = pd.DataFrame([kpi_metrics])
-kpi_df.to_csv("data/processed/summary_metrics.csv", index=False)
-print("✔ summary_metrics.csv saved")
-
-# -------------------------------------------------------------------
-# 3. CITY RISK DISTRIBUTION CSV
+# Load environment and connect
 # -------------------------------------------------------------------
-print("Generating risk distribution per city...")
+def get_supabase_client():
+    load_dotenv()
 
-risk_city_df = df.groupby(["city", "risk_flag"]).size().reset_index(name="count")
-risk_city_df.to_csv("data/processed/city_risk_distribution.csv", index=False)
-print("✔ city_risk_distribution.csv saved")
+    SUPABASE_URL = os.getenv("SUPABASE_URL")
+    SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-# -------------------------------------------------------------------
-# 4. POLLUTION TRENDS CSV
-# -------------------------------------------------------------------
-print("Generating pollution trend report...")
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise SystemExit("❌ Please set SUPABASE_URL and SUPABASE_KEY in .env")
 
-trend_df = df[["time", "city", "pm2_5", "pm10", "ozone"]].copy()
-trend_df.to_csv("data/processed/pollution_trends.csv", index=False)
-
-print("✔ pollution_trends.csv saved")
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 # -------------------------------------------------------------------
-# 5. VISUALIZATIONS
+# Plot jobs
+# Top-level functions so they can run in a ProcessPoolExecutor; each
+# builds its own Figure since Figures can't be shared across processes.
 # -------------------------------------------------------------------
-print("Generating plots...")
-
-# A. Histogram of PM2.5
-plt.figure(figsize=(8,5))
-plt.hist(df["pm2_5"].dropna(), bins=30)
-plt.title("PM2.5 Distribution")
-plt.xlabel("PM2.5")
-plt.ylabel("Frequency")
-plt.savefig("plots/pm25_histogram.png", dpi=300)
-plt.close()
-
-# B. Bar chart of risk flags per city
-plt.figure(figsize=(10,6))
-risk_city_df.pivot(index="city", columns="risk_flag", values="count").plot(kind="bar")
-plt.title("Risk Levels Per City")
-plt.ylabel("Count")
-plt.tight_layout()
-plt.savefig("plots/risk_per_city.png", dpi=300)
-plt.close()
-
-# C. Line chart of hourly PM2.5 trend for each city
-plt.figure(figsize=(12,6))
-for city in df["city"].unique():
-    city_df = df[df["city"] == city].sort_values("time")
-    plt.plot(city_df["time"], city_df["pm2_5"], label=city)
-
-plt.legend()
-plt.title("Hourly PM2.5 Trend")
-plt.xlabel("Time")
-plt.ylabel("PM2.5")
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig("plots/pm25_trend.png", dpi=300)
-plt.close()
-
-# D. Scatter plot: severity_score vs pm2_5
-plt.figure(figsize=(8,5))
-plt.scatter(df["pm2_5"], df["severity_score"])
-plt.title("Severity Score vs PM2.5")
-plt.xlabel("PM2.5")
-plt.ylabel("Severity Score")
-plt.savefig("plots/severity_vs_pm25.png", dpi=300)
-plt.close()
-
-print("\n✨ ANALYSIS COMPLETE")
-print("CSV files saved to: data/processed/")
-print("Plots saved to: plots/")
+def _plot_pm25_histogram(pm25, out_path):
+    fig, ax = plt.subplots(figsize=(8,5))
+    ax.hist(pm25, bins=30)
+    ax.set_title("PM2.5 Distribution")
+    ax.set_xlabel("PM2.5")
+    ax.set_ylabel("Frequency")
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=PLOT_DPI)
+    plt.close(fig)
+
+
+def _plot_risk_per_city(cities, risk_levels, counts, out_path):
+    """counts: (len(cities), len(risk_levels)) array of row counts."""
+    # Grouped bars drawn directly, laid out like pandas' kind="bar"
+    fig, ax = plt.subplots(figsize=(10,6))
+    x = np.arange(len(cities))
+    width = 0.8 / max(1, len(risk_levels))
+    for i, risk in enumerate(risk_levels):
+        ax.bar(x + i * width, counts[:, i], width, label=risk)
+    ax.set_xticks(x + width * (len(risk_levels) - 1) / 2)
+    ax.set_xticklabels(cities, rotation=90)
+    ax.set_xlabel("city")
+    ax.legend(title="risk_flag")
+    ax.set_title("Risk Levels Per City")
+    ax.set_ylabel("Count")
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=PLOT_DPI)
+    plt.close(fig)
+
+
+def _plot_pm25_trend(city_series, out_path):
+    """city_series: list of (city, times, pm2_5) arrays, already downsampled."""
+    fig, ax = plt.subplots(figsize=(12,6))
+    for city, times, values in city_series:
+        ax.plot(times, values, label=city)
+    ax.legend()
+    ax.set_title("Hourly PM2.5 Trend")
+    ax.set_xlabel("Time")
+    ax.set_ylabel("PM2.5")
+    ax.tick_params(axis="x", labelrotation=45)
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=PLOT_DPI)
+    plt.close(fig)
+
+
+def _plot_severity_vs_pm25(pm25, severity, out_path):
+    # hexbin cost doesn't grow with overplotting, unlike scatter
+    fig, ax = plt.subplots(figsize=(8,5))
+    hb = ax.hexbin(pm25, severity, gridsize=60, mincnt=1)
+    fig.colorbar(hb, ax=ax, label="Count")
+    ax.set_title("Severity Score vs PM2.5")
+    ax.set_xlabel("PM2.5")
+    ax.set_ylabel("Severity Score")
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=PLOT_DPI)
+    plt.close(fig)
+
+
+def run_analysis():
+    supabase = get_supabase_client()
+
+    # -------------------------------------------------------------------
+    # 1. Fetch data from Supabase
+    # -------------------------------------------------------------------
+    print("Fetching data from Supabase...")
+
+    res = supabase.table("air_quality_data").select("*").execute()
+    df = pd.DataFrame(res.data)
+
+    print(f"Loaded {len(df)} rows for analysis.")
+
+    # Ensure correct dtypes
+    # Supabase returns full ISO-8601 strings; parse them on the ISO fast path
+    df["time"] = pd.to_datetime(df["time"], format="ISO8601", errors="coerce", cache=True, utc=True)
+    numeric_cols = [
+        "pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide",
+        "sulphur_dioxide", "ozone", "uv_index", "severity_score", "hour"
+    ]
+
+    for col in numeric_cols:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    # Few distinct values each: groupby/value_counts then work on int codes
+    for col in ["city", "risk_flag", "aqi_category"]:
+        df[col] = df[col].astype("category")
+
+    # -------------------------------------------------------------------
+    # 2. KPI METRICS
+    # -------------------------------------------------------------------
+    print("\nGenerating KPI metrics...")
+
+    kpi_metrics = {}
+
+    # Per-city means in a single grouped pass
+    city_stats = df.groupby("city", observed=True).agg(
+        pm25_mean=("pm2_5", "mean"),
+        sev_mean=("severity_score", "mean"),
+    )
+
+    # A: City with highest average PM2.5
+    kpi_metrics["city_highest_pm25"] = (
+        city_stats["pm25_mean"].idxmax()
+        if not df.empty else None
+    )
+
+    # B: City with highest severity score
+    kpi_metrics["city_highest_severity"] = (
+        city_stats["sev_mean"].idxmax()
+        if not df.empty else None
+    )
+
+    # C: Risk percentage distribution
+    risk_counts = df["risk_flag"].value_counts(normalize=True) * 100
+    risk_distribution = risk_counts.to_dict()
+
+    # D: Hour of day with worst AQI (pm2_5)
+    kpi_metrics["worst_hour"] = (
+        df.groupby("hour")["pm2_5"].mean().idxmax()
+        if not df.empty else None
+    )
+
+    # Convert KPI to DataFrame
+    kpi_df = pd.DataFrame([kpi_metrics])
+    kpi_df.to_csv("data/processed/summary_metrics.csv", index=False)
+    print("✔ summary_metrics.csv saved")
+
+    # -------------------------------------------------------------------
+    # 3. CITY RISK DISTRIBUTION CSV
+    # -------------------------------------------------------------------
+    print("Generating risk distribution per city...")
+
+    risk_city_df = df.groupby(["city", "risk_flag"], observed=True).size().reset_index(name="count")
+    risk_city_df.to_csv("data/processed/city_risk_distribution.csv", index=False)
+    print("✔ city_risk_distribution.csv saved")
+
+    # -------------------------------------------------------------------
+    # 4. POLLUTION TRENDS CSV
+    # -------------------------------------------------------------------
+    print("Generating pollution trend report...")
+
+    trend_df = df[["time", "city", "pm2_5", "pm10", "ozone"]].copy()
+    trend_df.to_csv("data/processed/pollution_trends.csv", index=False)
+
+    print("✔ pollution_trends.csv saved")
+
+    # -------------------------------------------------------------------
+    # 5. VISUALIZATIONS
+    # -------------------------------------------------------------------
+    print("Generating plots...")
+
+    # Precompute plain arrays so each job ships only what it draws
+    risk_pivot = risk_city_df.pivot(index="city", columns="risk_flag", values="count").fillna(0)
+
+    # Sort once and partition once; stable sort keeps the cities' legend order
+    city_series = []
+    for city, city_df in df.sort_values("time", kind="stable").groupby("city", observed=True, sort=False):
+        stride = max(1, len(city_df) // MAX_TREND_POINTS)
+        city_series.append((
+            city,
+            city_df["time"].values[::stride],
+            city_df["pm2_5"].values[::stride],
+        ))
+
+    jobs = [
+        (_plot_pm25_histogram, df["pm2_5"].dropna().to_numpy(), "plots/pm25_histogram.png"),
+        (_plot_risk_per_city, list(risk_pivot.index), list(risk_pivot.columns),
+         risk_pivot.to_numpy(), "plots/risk_per_city.png"),
+        (_plot_pm25_trend, city_series, "plots/pm25_trend.png"),
+        (_plot_severity_vs_pm25, df["pm2_5"].to_numpy(), df["severity_score"].to_numpy(),
+         "plots/severity_vs_pm25.png"),
+    ]
+
+    with ProcessPoolExecutor(max_workers=len(jobs)) as ex:
+        futures = [ex.submit(fn, *args) for fn, *args in jobs]
+        for future in futures:
+            future.result()  # re-raise any plotting error here
+
+    print("\n✨ ANALYSIS COMPLETE")
+    print("CSV files saved to: data/processed/")
+    print("Plots saved to: plots/")
+
+
+if __name__ == "__main__":
+    run_analysis()
@@ -1,10 +1,12 @@
 import os
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Optional
 import requests
+from requests.adapters import HTTPAdapter
 
 # ------------------------------
 # Config
@@ -23,7 +25,12 @@ CITIES = {
 API_BASE = "https://air-quality-api.open-meteo.com/v1/air-quality"
 MAX_RETRIES = 3
 TIMEOUT = 10
-SLEEP_BETWEEN_CALLS = 1.0  # seconds
+MAX_WORKERS = len(CITIES)
+MAX_STALENESS = 3600  # seconds; Open-Meteo AQI updates hourly
+
+# Shared session so all workers reuse pooled keep-alive connections
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
 
 # ------------------------------
 # Helper functions
@@ -45,6 +52,13 @@ def save_raw(city: str, payload: dict) -> str:
 
 def fetch_city(city: str, lat: float, lon: float) -> Dict[str, Optional[str]]:
     """Fetch hourly pollutant data for a city with retry logic."""
+    # Reuse the latest raw file if it is fresh enough (filenames sort by timestamp)
+    existing = sorted(RAW_DIR.glob(f"{city.lower()}_raw_*.json"))
+    if existing and time.time() - existing[-1].stat().st_mtime < MAX_STALENESS:
+        path = str(existing[-1].resolve())
+        print(f"♻️ [{city}] Raw data is less than {MAX_STALENESS}s old, reusing {path}")
+        return {"city": city, "success": True, "raw_path": path, "cached": True}
+
     params = {
         "latitude": lat,
         "longitude": lon,
@@ -53,7 +67,7 @@ def fetch_city(city: str, lat: float, lon: float) -> Dict[str, Optional[str]]:
 
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            resp = requests.get(API_BASE, params=params, timeout=TIMEOUT)
+            resp = session.get(API_BASE, params=params, timeout=TIMEOUT)
             resp.raise_for_status()
             data = resp.json()
             path = save_raw(city, data)
@@ -69,15 +83,16 @@ def fetch_city(city: str, lat: float, lon: float) -> Dict[str, Optional[str]]:
 
 
 def fetch_all_cities() -> List[Dict[str, Optional[str]]]:
-    results = []
-    for city, coords in CITIES.items():
-        res = fetch_city(city, coords["lat"], coords["lon"])
-        results.append(res)
-        time.sleep(SLEEP_BETWEEN_CALLS)
+    """Fetch all cities concurrently; each worker keeps its own retry/backoff."""
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        results = list(ex.map(
+            lambda kv: fetch_city(kv[0], kv[1]["lat"], kv[1]["lon"]),
+            CITIES.items(),
+        ))
     return results
 
 
-if __name__ == "__main__":
+def main() -> List[Dict[str, Optional[str]]]:
     print("Starting extraction of hourly AQI data...")
     output = fetch_all_cities()
     print("Extraction complete. Summary:")
@@ -86,3 +101,8 @@ if __name__ == "__main__":
             print(f" - {r['city']}: saved -> {r['raw_path']}")
         else:
             print(f" - {r['city']}: ERROR -> {r.get('error')}")
+    return output
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import os
 import time
 import math
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 import pandas as pd
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
 from supabase import create_client
 
@@ -14,14 +16,26 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "200"))
 LOAD_MAX_RETRIES = int(os.getenv("LOAD_MAX_RETRIES", "2"))
 LOAD_BACKOFF_SECONDS = int(os.getenv("LOAD_BACKOFF_SECONDS", "3"))
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "8"))
 
-TRANSFORMED_FILE = os.getenv("TRANSFORMED_FILE", "data/staged/air_quality_transformed.csv")
+TRANSFORMED_FILE = os.getenv("TRANSFORMED_FILE", "data/staged/air_quality_transformed.parquet")
 TABLE_NAME = os.getenv("TABLE_NAME", "air_quality_data")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise SystemExit("Please set SUPABASE_URL and SUPABASE_KEY in .env")
+# Requires a unique index on the table, e.g.:
+#   CREATE UNIQUE INDEX IF NOT EXISTS air_quality_data_city_time_key
+#       ON air_quality_data (city, time);
+ON_CONFLICT = "city,time"
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+_supabase = None
+
+def get_supabase_client():
+    """Create the Supabase client on first use, so importing load has no side effects."""
+    global _supabase
+    if _supabase is None:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise SystemExit("Please set SUPABASE_URL and SUPABASE_KEY in .env")
+        _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
 
 def normalize_and_prepare(df: pd.DataFrame) -> list:
     """
@@ -65,74 +79,96 @@ def normalize_and_prepare(df: pd.DataFrame) -> list:
         if c not in df.columns:
             df[c] = None
 
-    # Convert time to ISO formatted strings (or None)
-    df["time"] = pd.to_datetime(df["time"], errors="coerce")
+    # Convert time to ISO formatted strings (or None); Parquet keeps it datetime64
     df["time"] = df["time"].apply(lambda t: t.isoformat() if not pd.isna(t) else None)
 
-    # Convert numeric columns to native python types and NaN->None
-    numeric_cols = ["pm10","pm2_5","carbon_monoxide","nitrogen_dioxide",
-                    "sulphur_dioxide","ozone","uv_index","severity_score","hour"]
-    for c in numeric_cols:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-            df[c] = df[c].where(df[c].notna(), None)
-
-    # Text columns: convert NaN → None
-    text_cols = ["city","aqi_category","risk_flag"]
-    for c in text_cols:
-        df[c] = df[c].where(df[c].notna(), None)
+    # NaN -> None for every column in one pass; object dtype also turns
+    # numpy scalars and categoricals into native python values
+    prepared = df[expected]
+    prepared = prepared.astype(object).where(prepared.notna(), None)
 
     # Convert DataFrame to list of dicts
-    records = df[expected].to_dict(orient="records")
+    records = prepared.to_dict(orient="records")
     return records
 
-def insert_batches(records: list):
-    total = len(records)
-    inserted = 0
-    if total == 0:
-        print("No records to insert.")
-        return inserted
-
-    batches = math.ceil(total / BATCH_SIZE)
-    for idx in range(0, total, BATCH_SIZE):
-        batch = records[idx: idx + BATCH_SIZE]
-        batch_no = idx // BATCH_SIZE + 1
-
-        attempt = 0
-        while attempt <= LOAD_MAX_RETRIES:
-            try:
-                # supabase-py insertion
-                res = supabase.table(TABLE_NAME).insert(batch).execute()
-                # Check for errors in response (library version dependent)
-                if hasattr(res, "error") and res.error:
-                    raise RuntimeError(res.error)
-                # Some versions return dict-like: res.get("error")
-                if isinstance(res, dict) and res.get("error"):
-                    raise RuntimeError(res.get("error"))
-                print(f"✅ Inserted batch {batch_no}/{batches} ({len(batch)} rows)")
-                inserted += len(batch)
+def _post_batch(batch: list, batch_no: int, batches: int) -> int:
+    """Insert one batch with retries; returns the number of rows inserted."""
+    attempt = 0
+    while attempt <= LOAD_MAX_RETRIES:
+        try:
+            # supabase-py upsert: rows already loaded for (city, time) are skipped
+            res = (
+                get_supabase_client().table(TABLE_NAME)
+                .upsert(batch, on_conflict=ON_CONFLICT, ignore_duplicates=True)
+                .execute()
+            )
+            # Check for errors in response (library version dependent)
+            if hasattr(res, "error") and res.error:
+                raise RuntimeError(res.error)
+            # Some versions return dict-like: res.get("error")
+            if isinstance(res, dict) and res.get("error"):
+                raise RuntimeError(res.get("error"))
+            print(f"✅ Inserted batch {batch_no}/{batches} ({len(batch)} rows)")
+            return len(batch)
+        except Exception as e:
+            attempt += 1
+            print(f"⚠️ Insert failed for batch {batch_no} (attempt {attempt}/{LOAD_MAX_RETRIES}): {e}")
+            if attempt > LOAD_MAX_RETRIES:
+                print(f"❌ Skipping batch {batch_no} after repeated failures.")
                 break
-            except Exception as e:
-                attempt += 1
-                print(f"⚠️ Insert failed for batch {batch_no} (attempt {attempt}/{LOAD_MAX_RETRIES}): {e}")
-                if attempt > LOAD_MAX_RETRIES:
-                    print(f"❌ Skipping batch {batch_no} after repeated failures.")
-                    break
-                time.sleep(LOAD_BACKOFF_SECONDS)
+            time.sleep(LOAD_BACKOFF_SECONDS)
+    return 0
+
+def insert_batches(record_batches, batches: int):
+    """
+    Insert an iterable of record lists (one per batch) into Supabase.
+    Up to LOAD_WORKERS batches are posted concurrently; batches are consumed
+    lazily, so at most that many are held in memory at a time.
+    """
+    inserted = 0
+    pending = set()
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as pool:
+        for batch_no, batch in enumerate(record_batches, start=1):
+            if len(pending) >= LOAD_WORKERS:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                inserted += sum(f.result() for f in done)
+            pending.add(pool.submit(_post_batch, batch, batch_no, batches))
+
+        inserted += sum(f.result() for f in as_completed(pending))
     return inserted
 
-def load_data():
-    if not os.path.exists(TRANSFORMED_FILE):
-        print("❌ No transformed file found. Run transform.py first!")
+def load_data(df: pd.DataFrame = None):
+    """
+    Load transformed rows into Supabase.
+    Uses df when the pipeline hands it over in memory; otherwise streams
+    the staged Parquet file.
+    """
+    if df is not None:
+        total = len(df)
+        print(f"Loading {total} rows from the transform step.")
+        chunks = (df.iloc[i: i + BATCH_SIZE].copy() for i in range(0, total, BATCH_SIZE))
+    else:
+        if not os.path.exists(TRANSFORMED_FILE):
+            print("❌ No transformed file found. Run transform.py first!")
+            return
+
+        staged = pq.ParquetFile(TRANSFORMED_FILE)
+        total = staged.metadata.num_rows
+        print(f"Streaming {total} rows from staged file.")
+        chunks = (chunk.to_pandas() for chunk in staged.iter_batches(batch_size=BATCH_SIZE))
+
+    if total == 0:
+        print("No records to insert.")
         return
 
-    df = pd.read_csv(TRANSFORMED_FILE)
-    print(f"Loaded {len(df)} rows from staged file.")
+    # Fail fast on missing credentials, before any worker thread starts
+    get_supabase_client()
 
-    records = normalize_and_prepare(df)
-    inserted = insert_batches(records)
+    # One BATCH_SIZE chunk is prepared per batch, consumed as it is inserted
+    record_batches = (normalize_and_prepare(chunk) for chunk in chunks)
+    inserted = insert_batches(record_batches, math.ceil(total / BATCH_SIZE))
 
-    print(f"\n⭐ Load completed: {inserted}/{len(records)} rows inserted.")
+    print(f"\n⭐ Load completed: {inserted}/{total} rows inserted.")
 
 if __name__ == "__main__":
     load_data()
\ No newline at end of file
@@ -1,27 +1,27 @@
-import os
-import subprocess
 import datetime
 import sys
 
+from extract import main as extract_cities
+from transform import transform_data
+from load import load_data
+from etl_analysis import run_analysis
+
 # ---------------------------------------------------------
-# Helper function to run a script and show live output
+# Helper function to run a stage in-process with a banner
 # ---------------------------------------------------------
-def run_step(title, command):
+def run_step(title, func, *args):
     print("\n" + "=" * 60)
     print(f"▶️  {title}")
     print("=" * 60)
 
     try:
-        # Run and stream output live
-        result = subprocess.run(
-            [sys.executable, command],
-            capture_output=False,
-            check=True
-        )
+        result = func(*args)
         print(f"✅ {title} completed\n")
+        return result
 
-    except subprocess.CalledProcessError as e:
-        print(f"❌ {title} failed with error code {e.returncode}")
+    except (Exception, SystemExit) as e:
+        # SystemExit too: load/analysis exit with a message on missing .env
+        print(f"❌ {title} failed with error: {e}")
         print("Stopping pipeline...\n")
         sys.exit(1)
 
@@ -37,16 +37,16 @@ if __name__ == "__main__":
     print(f"Run started at: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
 
     # 1. Extract
-    run_step("STEP 1 — Extract (extract.py)", "extract.py")
+    run_step("STEP 1 — Extract (extract.py)", extract_cities)
 
     # 2. Transform
-    run_step("STEP 2 — Transform (transform.py)", "transform.py")
+    df = run_step("STEP 2 — Transform (transform.py)", transform_data)
 
-    # 3. Load
-    run_step("STEP 3 — Load to Supabase (load.py)", "load.py")
+    # 3. Load (DataFrame handed over in memory, no staged-file re-read)
+    run_step("STEP 3 — Load to Supabase (load.py)", load_data, df)
 
-    # 4. Analysis
-    run_step("STEP 4 — Analysis & Reports (etl_analysis.py)", "etl_analysis.py")
+    # 4. Analysis (reads back from Supabase, so it covers all loaded runs)
+    run_step("STEP 4 — Analysis & Reports (etl_analysis.py)", run_analysis)
 
     end_time = datetime.datetime.now()
     duration = end_time - start_time
@@ -5,11 +5,12 @@ Transform step for AtmosTrack Multi-City AQI ETL Pipeline.
 
 - Flattens hourly JSON into tabular format
 - Computes AQI category, severity score, and risk classification
-- Saves combined CSV to data/staged/air_quality_transformed.csv
+- Saves combined Parquet (Snappy) to data/staged/air_quality_transformed.parquet
 """
 
-import json
 from pathlib import Path
+import numpy as np
+import orjson
 import pandas as pd
 
 # ------------------------------
@@ -18,47 +19,53 @@ import pandas as pd
 RAW_DIR = Path("data/raw/")
 STAGED_DIR = Path("data/staged/")
 STAGED_DIR.mkdir(parents=True, exist_ok=True)
-STAGED_FILE = STAGED_DIR / "air_quality_transformed.csv"
+STAGED_FILE = STAGED_DIR / "air_quality_transformed.parquet"
+
+# Open-Meteo hourly timestamps are fixed-format and in GMT
+TIME_FORMAT = "%Y-%m-%dT%H:%M"
 
 # ------------------------------
 # Feature Engineering
 # ------------------------------
-def compute_aqi(pm2_5):
-    if pm2_5 <= 50:
-        return "Good"
-    elif pm2_5 <= 100:
-        return "Moderate"
-    elif pm2_5 <= 200:
-        return "Unhealthy"
-    elif pm2_5 <= 300:
-        return "Very Unhealthy"
-    else:
-        return "Hazardous"
-
-def compute_severity(row):
-    return (
-        row.get("pm2_5", 0) * 5 +
-        row.get("pm10", 0) * 3 +
-        row.get("nitrogen_dioxide", 0) * 4 +
-        row.get("sulphur_dioxide", 0) * 4 +
-        row.get("carbon_monoxide", 0) * 2 +
-        row.get("ozone", 0) * 3
-    )
-
-def classify_risk(severity):
-    if severity > 400:
-        return "High Risk"
-    elif severity > 200:
-        return "Moderate Risk"
-    else:
-        return "Low Risk"
+# Upper (inclusive) edges of each bucket; anything above the last is the top label
+AQI_EDGES = np.array([50, 100, 200, 300], dtype=np.float64)
+AQI_LABELS = ["Good", "Moderate", "Unhealthy", "Very Unhealthy", "Hazardous"]
+
+# severity = POLLUTANT_COLS · SEVERITY_WEIGHTS, as one (N,6) mat-vec
+POLLUTANT_COLS = ["pm2_5", "pm10", "nitrogen_dioxide", "sulphur_dioxide", "carbon_monoxide", "ozone"]
+SEVERITY_WEIGHTS = np.array([5, 3, 4, 4, 2, 3], dtype=np.float64)
+
+RISK_EDGES = np.array([200, 400], dtype=np.float64)
+RISK_LABELS = ["Low Risk", "Moderate Risk", "High Risk"]
+
+def bucketize(values, edges, labels, missing_code=-1) -> pd.Categorical:
+    """
+    Right-inclusive bucketing like pd.cut: a single searchsorted pass emits
+    int8 codes that become a Categorical without building intervals.
+    NaN gets missing_code (-1 = missing).
+    """
+    values = np.asarray(values)
+    codes = np.searchsorted(edges, values, side="left").astype(np.int8)
+    codes[np.isnan(values)] = missing_code
+    return pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+
+def compute_aqi(pm2_5: pd.Series) -> pd.Categorical:
+    # Missing pm2_5 falls through to "Hazardous", as before
+    return bucketize(pm2_5, AQI_EDGES, AQI_LABELS, missing_code=len(AQI_LABELS) - 1)
+
+def compute_severity(df: pd.DataFrame) -> np.ndarray:
+    return df[POLLUTANT_COLS].to_numpy(dtype=np.float64) @ SEVERITY_WEIGHTS
+
+def classify_risk(severity: pd.Series) -> pd.Categorical:
+    # Missing severity falls through to "Low Risk", as before
+    return bucketize(severity, RISK_EDGES, RISK_LABELS, missing_code=0)
 
 # ------------------------------
 # Transform single city file
 # ------------------------------
 def transform_city_file(file_path: Path) -> pd.DataFrame:
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(file_path, "rb") as f:
+        data = orjson.loads(f.read())
 
     city_name = file_path.stem.split("_raw_")[0]
     hourly = data.get("hourly", {})
@@ -80,13 +87,13 @@ def transform_city_file(file_path: Path) -> pd.DataFrame:
     df = df.dropna(subset=["pm10","pm2_5","carbon_monoxide","nitrogen_dioxide","ozone","sulphur_dioxide"], how="all")
 
     # Convert time to datetime and extract hour
-    df["time"] = pd.to_datetime(df["time"], errors="coerce")
+    df["time"] = pd.to_datetime(df["time"], format=TIME_FORMAT, errors="coerce", cache=True, utc=True)
     df["hour"] = df["time"].dt.hour
 
     # Feature engineering
-    df["AQI_category"] = df["pm2_5"].apply(compute_aqi)
-    df["severity"] = df.apply(compute_severity, axis=1)
-    df["risk"] = df["severity"].apply(classify_risk)
+    df["AQI_category"] = compute_aqi(df["pm2_5"])
+    df["severity"] = compute_severity(df)
+    df["risk"] = classify_risk(df["severity"])
 
     return df
 
@@ -94,17 +101,16 @@ def transform_city_file(file_path: Path) -> pd.DataFrame:
 # Transform all files
 # ------------------------------
 def transform_all():
-    files = list(RAW_DIR.glob("*.json"))
     all_dfs = []
 
-    for f in files:
+    for f in RAW_DIR.glob("*.json"):
         df = transform_city_file(f)
         if not df.empty:
             all_dfs.append(df)
 
     if all_dfs:
         final_df = pd.concat(all_dfs, ignore_index=True)
-        final_df.to_csv(STAGED_FILE, index=False)
+        final_df.to_parquet(STAGED_FILE, index=False, compression="snappy")
         print(f"✅ Transformed data saved to {STAGED_FILE}")
         return final_df
     else:
@@ -122,7 +128,7 @@ if __name__ == "__main__":
 
 
 import os
-import json
+import orjson
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
@@ -132,36 +138,20 @@ STAGED_DIR = "data/staged"
 
 os.makedirs(STAGED_DIR, exist_ok=True)
 
-OUTPUT_FILE = os.path.join(STAGED_DIR, "air_quality_transformed.csv")
+OUTPUT_FILE = os.path.join(STAGED_DIR, "air_quality_transformed.parquet")
 
 # ---------------------------
 # AQI Category (PM2.5 Based)
 # ---------------------------
 def aqi_category(pm25):
-    if pd.isna(pm25):
-        return "Unknown"
-    if pm25 <= 50:
-        return "Good"
-    elif pm25 <= 100:
-        return "Moderate"
-    elif pm25 <= 200:
-        return "Unhealthy"
-    elif pm25 <= 300:
-        return "Very Unhealthy"
-    else:
-        return "Hazardous"
+    return bucketize(pm25, AQI_EDGES, AQI_LABELS + ["Unknown"], missing_code=len(AQI_LABELS))
 
 
 # ---------------------------
 # Risk Classification
 # ---------------------------
 def classify_risk(severity):
-    if severity > 400:
-        return "High Risk"
-    elif severity > 200:
-        return "Moderate Risk"
-    else:
-        return "Low Risk"
+    return bucketize(severity, RISK_EDGES, RISK_LABELS, missing_code=0)
 
 
 # ---------------------------
@@ -169,19 +159,23 @@ def classify_risk(severity):
 # ---------------------------
 def transform_data():
 
-    all_rows = []
-
-    raw_files = list(Path(RAW_DIR).glob("*.json"))
+    num_cols = [
+        "pm10", "pm2_5", "carbon_monoxide",
+        "nitrogen_dioxide", "sulphur_dioxide",
+        "ozone", "uv_index"
+    ]
 
-    if not raw_files:
-        print("❌ No raw files found in data/raw/. Run extract.py first!")
-        return
+    # Columnar buffers: one array per column per file, concatenated once
+    arrays = {col: [] for col in num_cols}
+    cities = []
+    times = []
 
-    for file in raw_files:
+    # Glob lazily; emptiness is checked once the files have been read
+    for file in Path(RAW_DIR).glob("*.json"):
         city = file.name.split("_")[0]
 
-        with open(file, "r") as f:
-            data = json.load(f)
+        with open(file, "rb") as f:
+            data = orjson.loads(f.read())
 
         if "hourly" not in data:
             print(f" Skipping {file} — No 'hourly' field")
@@ -189,69 +183,55 @@ def transform_data():
 
         hourly = data["hourly"]
 
-        times = hourly.get("time", [])
-        pm10 = hourly.get("pm10", [])
-        pm25 = hourly.get("pm2_5", [])
-        co = hourly.get("carbon_monoxide", [])
-        no2 = hourly.get("nitrogen_dioxide", [])
-        so2 = hourly.get("sulphur_dioxide", [])
-        ozone = hourly.get("ozone", [])
-        uv = hourly.get("uv_index", [])
-
-        rows = zip(times, pm10, pm25, co, no2, so2, ozone, uv)
-
-        for t, p10, p25, co_v, no2_v, so2_v, oz_v, uv_v in rows:
-            row = {
-                "city": city,
-                "time": t,
-                "pm10": p10,
-                "pm2_5": p25,
-                "carbon_monoxide": co_v,
-                "nitrogen_dioxide": no2_v,
-                "sulphur_dioxide": so2_v,
-                "ozone": oz_v,
-                "uv_index": uv_v,
-            }
-            all_rows.append(row)
-
-    df = pd.DataFrame(all_rows)
+        file_times = hourly.get("time", [])
+        n = len(file_times)
 
-    # Convert time → datetime
-    df["time"] = pd.to_datetime(df["time"], errors="coerce")
+        for col in num_cols:
+            # Typed buffer sized from the time axis, filled straight from the
+            # parsed list: JSON nulls land as NaN, and a missing or short
+            # pollutant list leaves NaN padding instead of misaligning rows
+            buf = np.full(n, np.nan, dtype=np.float64)
+            values = hourly.get(col) or []
+            m = min(n, len(values))
+            buf[:m] = values if m == len(values) else values[:m]
+            arrays[col].append(buf)
 
-    # Convert numeric columns
-    num_cols = [
-        "pm10", "pm2_5", "carbon_monoxide",
-        "nitrogen_dioxide", "sulphur_dioxide",
-        "ozone", "uv_index"
-    ]
+        times.append(np.asarray(file_times, dtype=object))
+        cities.append(np.full(n, city, dtype=object))
 
-    for col in num_cols:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
+    if not times:
+        print("❌ No raw files found in data/raw/. Run extract.py first!")
+        return
+
+    df = pd.DataFrame({
+        "city": np.concatenate(cities),
+        "time": np.concatenate(times),
+        **{col: np.concatenate(arrays[col]) for col in num_cols},
+    })
+
+    # Convert time → datetime
+    df["time"] = pd.to_datetime(df["time"], format=TIME_FORMAT, errors="coerce", cache=True, utc=True)
 
     # Remove rows where all pollutants are missing
     df.dropna(subset=num_cols, how="all", inplace=True)
 
     # Feature Engineering
-    df["AQI_Category"] = df["pm2_5"].apply(aqi_category)
+    df["AQI_Category"] = aqi_category(df["pm2_5"])
 
-    df["severity"] = (
-        (df["pm2_5"] * 5) +
-        (df["pm10"] * 3) +
-        (df["nitrogen_dioxide"] * 4) +
-        (df["sulphur_dioxide"] * 4) +
-        (df["carbon_monoxide"] * 2) +
-        (df["ozone"] * 3)
-    )
+    df["severity"] = compute_severity(df)
 
-    df["Risk_Level"] = df["severity"].apply(classify_risk)
+    df["Risk_Level"] = classify_risk(df["severity"])
 
     df["hour"] = df["time"].dt.hour
 
-    # Save final staged file
-    df.to_csv(OUTPUT_FILE, index=False)
+    # Stored as dictionary-encoded columns, so the codes survive in Parquet
+    df["city"] = df["city"].astype("category")
+
+    # Save final staged file (typed columnar, so load.py skips re-parsing text)
+    df.to_parquet(OUTPUT_FILE, index=False, compression="snappy")
 
     print(f" Transform completed! File saved to:\n{OUTPUT_FILE}")
+    return df
 
 
 if __name__ == "__main__":
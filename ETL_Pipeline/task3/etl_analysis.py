@@ -1,3 +1,4 @@
+import csv
 import os
 import pandas as pd
 import numpy as np
@@ -22,15 +23,71 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 # ---------------------------------------------------------
 # Fetch Data
 # ---------------------------------------------------------
+# Grouping keys, cast to category once at fetch so every groupby runs on codes
+CATEGORY_COLS = ("contract", "tenure_group", "internetservice", "churn",
+                 "monthly_charge_segment", "paymentmethod")
+
+# Aggregates are computed in Postgres; create once in the Supabase SQL Editor.
+CHURN_SUMMARY_SQL = """
+CREATE OR REPLACE FUNCTION churn_summary()
+RETURNS TABLE (
+    contract TEXT,
+    tenure_group TEXT,
+    internetservice TEXT,
+    churn TEXT,
+    customers BIGINT,
+    priced BIGINT,
+    monthly_sum FLOAT
+)
+LANGUAGE sql STABLE AS $$
+    SELECT contract, tenure_group, internetservice, churn,
+           count(*), count(monthlycharges), sum(monthlycharges)
+    FROM churn_data
+    GROUP BY contract, tenure_group, internetservice, churn
+$$;
+"""
+
+
+def fetch_summary():
+    print("[INFO] Fetching churn summary from Supabase...")
+    try:
+        response = supabase.rpc("churn_summary").execute()
+    except Exception:
+        print("[ERROR] RPC churn_summary() not available. Create it in the Supabase SQL Editor:")
+        print(CHURN_SUMMARY_SQL)
+        raise
+
+    summary = pd.DataFrame(response.data)
+    if summary.empty:
+        raise ValueError("No data retrieved from Supabase.")
+
+    for c in CATEGORY_COLS:
+        if c in summary:
+            summary[c] = summary[c].astype("category")
+
+    print(f"[INFO] Retrieved {len(summary)} summary rows.")
+    return summary
+
+
 def fetch_data():
+    # Row-level data is only needed for the plots
     print("[INFO] Fetching data from Supabase...")
-    response = supabase.table("churn_data").select("*").limit(10000).execute()
+    response = (
+        supabase.table("churn_data")
+        .select("totalcharges,monthly_charge_segment,churn,contract")
+        .limit(10000)
+        .execute()
+    )
     df = pd.DataFrame(response.data)
 
     if df.empty:
         raise ValueError("No data retrieved from Supabase.")
 
     df.columns = df.columns.str.lower()
+    for c in CATEGORY_COLS:
+        if c in df:
+            df[c] = df[c].astype("category")
+
     print(f"[INFO] Retrieved {len(df)} rows.")
     return df
 
@@ -38,22 +95,24 @@ def fetch_data():
 # ---------------------------------------------------------
 # Metrics Calculation
 # ---------------------------------------------------------
-def calculate_metrics(df):
+def calculate_metrics(summary):
     print("[INFO] Calculating metrics...")
 
-    churn_percentage = (
-        df["churn"].value_counts(normalize=True).get("yes", 0) * 100
-    )
+    # Roll the grouped summary up per column (NULL groups are dropped,
+    # matching value_counts on the raw rows)
+    counts = {
+        c: summary.groupby(c, observed=True)["customers"].sum().sort_values(ascending=False)
+        for c in ("churn", "tenure_group", "internetservice")
+    }
 
-    avg_monthly_by_contract = (
-        df.groupby("contract")["monthlycharges"]
-        .mean()
-        .round(2)
-        .to_dict()
-    )
+    churn_percentage = counts["churn"].get("yes", 0) / counts["churn"].sum() * 100
 
-    customer_type_dist = df["tenure_group"].value_counts().to_dict()
-    internet_dist = df["internetservice"].value_counts().to_dict()
+    by_contract = summary.groupby("contract", observed=True)[["monthly_sum", "priced"]].sum()
+    avg_monthly = by_contract["monthly_sum"] / by_contract["priced"]
+    avg_monthly_by_contract = dict(zip(avg_monthly.index, np.round(avg_monthly.to_numpy(), 2)))
+
+    customer_type_dist = counts["tenure_group"].to_dict()
+    internet_dist = counts["internetservice"].to_dict()
 
     return {
         "churn_percentage": round(churn_percentage, 2),
@@ -66,15 +125,13 @@ def calculate_metrics(df):
 # ---------------------------------------------------------
 # Pivot Table
 # ---------------------------------------------------------
-def churn_tenure_pivot(df):
+def churn_tenure_pivot(summary):
     print("[INFO] Creating pivot table...")
-    pivot = pd.pivot_table(
-        df,
-        index="tenure_group",
-        columns="churn",
-        values="monthlycharges",
-        aggfunc="count",
-        fill_value=0,
+    # Count of non-null monthlycharges per (tenure_group, churn)
+    pivot = (
+        summary.groupby(["tenure_group", "churn"], observed=True)["priced"]
+        .sum()
+        .unstack("churn", fill_value=0)
     )
     return pivot
 
@@ -87,8 +144,10 @@ def generate_visuals(df):
     os.makedirs("data/processed", exist_ok=True)
 
     # Histogram of TotalCharges
+    # Bin with numpy, then draw the 10 bars directly
+    counts, edges = np.histogram(df["totalcharges"].dropna().to_numpy(), bins=10)
     plt.figure(figsize=(6, 4))
-    plt.hist(df["totalcharges"].dropna())
+    plt.bar(edges[:-1], counts, width=np.diff(edges), align="edge")
     plt.title("Distribution of Total Charges")
     plt.xlabel("Total Charges")
     plt.ylabel("Count")
@@ -98,7 +157,8 @@ def generate_visuals(df):
 
     # Churn by Monthly Charge Segment
     plt.figure(figsize=(6, 4))
-    df.groupby("monthly_charge_segment")["churn"].value_counts().unstack().plot(kind="bar")
+    segment_churn = pd.crosstab(df["monthly_charge_segment"], df["churn"])
+    segment_churn.plot(kind="bar")
     plt.title("Churn by Monthly Charge Segment")
     plt.tight_layout()
     plt.savefig("data/processed/churn_by_charge_segment.png")
@@ -132,15 +192,16 @@ def save_summary(metrics, pivot):
     for k, v in metrics["internet_distribution"].items():
         summary_rows.append([f"Internet Service Count ({k})", v])
 
-    summary_df = pd.DataFrame(summary_rows, columns=["Metric", "Value"])
-
-    pivot_df = pivot.reset_index()
-    pivot_df.insert(0, "Metric", "Churn vs Tenure Group")
-
+    # Written row by row; the Value column stays float-formatted as before
     with open(output_path, "w", encoding="utf-8") as f:
-        summary_df.to_csv(f, index=False)
-        f.write("\n")
-        pivot_df.to_csv(f, index=False)
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(["Metric", "Value"])
+        w.writerows([metric, float(value)] for metric, value in summary_rows)
+        w.writerow([])
+
+        w.writerow(["Metric", pivot.index.name, *pivot.columns])
+        for idx, row in zip(pivot.index, pivot.to_numpy()):
+            w.writerow(["Churn vs Tenure Group", idx, *row])
 
     print(f"[INFO] Summary saved: {output_path}")
 
@@ -149,10 +210,11 @@ def save_summary(metrics, pivot):
 # Main
 # ---------------------------------------------------------
 if __name__ == "__main__":
-    df = fetch_data()
-    metrics = calculate_metrics(df)
-    pivot = churn_tenure_pivot(df)
+    summary = fetch_summary()
+    metrics = calculate_metrics(summary)
+    pivot = churn_tenure_pivot(summary)
 
+    df = fetch_data()
     generate_visuals(df)
     save_summary(metrics, pivot)
 
@@ -2,13 +2,22 @@
 # load.py
 # ===========================
 
+import importlib.util
+import io
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
-import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import httpx
+import orjson
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+# Concurrent REST batch uploads (kept under Supabase's default pool size of 10)
+UPLOAD_WORKERS = 8
+
 # ---------------------------------------------------------
 # 1️ LOAD ENVIRONMENT VARIABLES
 # ---------------------------------------------------------
@@ -26,6 +35,49 @@ def get_supabase_client():
 supabase = get_supabase_client()
 
 
+def get_rest_session():
+    # Dedicated keep-alive session for the batch inserts (HTTP/2 when h2 is
+    # installed), so TLS handshakes are paid once per connection, not once per
+    # insert. It carries the PostgREST URL and auth headers itself, so it does
+    # not depend on how supabase-py wires its own sub-clients.
+    SUPABASE_URL = os.getenv("SUPABASE_URL")
+    SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+    return httpx.Client(
+        base_url=f"{SUPABASE_URL.rstrip('/')}/rest/v1/",
+        headers={
+            "apikey": SUPABASE_KEY,
+            "Authorization": f"Bearer {SUPABASE_KEY}"
+        },
+        http2=importlib.util.find_spec("h2") is not None,
+        timeout=30,
+        limits=httpx.Limits(
+            max_connections=UPLOAD_WORKERS,
+            max_keepalive_connections=UPLOAD_WORKERS
+        )
+    )
+
+rest_session = get_rest_session()
+
+# Direct Postgres connection string (Supabase → Project Settings → Database).
+# When set, load_data() bulk-loads with COPY instead of REST batch inserts.
+SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
+
+# Columns written to churn_data (same order as the COPY column list)
+ALLOWED_COLS = [
+    "tenure", "monthlycharges", "totalcharges", "churn",
+    "internetservice", "contract", "paymentmethod",
+    "tenure_group", "monthly_charge_segment",
+    "has_internet_service", "is_multi_line_user",
+    "contract_type_code"
+]
+INT_COLS = ["tenure", "has_internet_service", "is_multi_line_user", "contract_type_code"]
+
+# Batches are pre-encoded with orjson and POSTed straight to PostgREST
+# (<SUPABASE_URL>/rest/v1/churn_data) through rest_session
+INSERT_HEADERS = {"Content-Type": "application/json", "Prefer": "return=minimal"}
+
+
 # ---------------------------------------------------------
 # 2️ CREATE TABLE IF DOES NOT EXIST (SAFE METHOD)
 # ---------------------------------------------------------
@@ -75,68 +127,134 @@ def create_table():
 
 
 # ---------------------------------------------------------
-# 3️ LOAD DATA INTO SUPABASE (Batch Upload)
+# 3️ BULK LOAD VIA POSTGRES COPY
 # ---------------------------------------------------------
+def copy_to_postgres(df):
+    import psycopg2
+
+    # Integer columns go out as "1" not "1.0"; NaN is written as an empty
+    # unquoted field, which COPY ... CSV reads as NULL.
+    df = df.astype({col: "Int64" for col in INT_COLS})
+
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False)
+
+    copy_sql = f"COPY churn_data ({', '.join(ALLOWED_COLS)}) FROM STDIN WITH CSV"
+    total_rows = len(df)
+
+    print(f" Uploading {total_rows} records to Postgres via COPY...")
+
+    attempts = 0
+    while attempts < 3:
+        conn = None
+        try:
+            buf.seek(0)
+            conn = psycopg2.connect(SUPABASE_DB_URL)
+            with conn, conn.cursor() as cur:
+                cur.copy_expert(copy_sql, buf)
+            print(f" Copied {total_rows} rows into churn_data")
+            return True
+
+        except Exception as e:
+            attempts += 1
+            print(f" COPY failed (Attempt {attempts}/3)")
+            print("   Error:", e)
+            time.sleep(2)
+
+        finally:
+            if conn is not None:
+                conn.close()
+
+    print(" Failed to COPY rows even after 3 retries.")
+    return False
+
+
+# ---------------------------------------------------------
+# 4️ LOAD DATA INTO SUPABASE (Batch Upload)
+# ---------------------------------------------------------
+def upload_batch(body, start, end):
+    attempts = 0
+
+    while attempts < 3:
+        try:
+            resp = rest_session.post(
+                "churn_data", content=body, headers=INSERT_HEADERS
+            )
+            resp.raise_for_status()
+            print(f" Uploaded rows {start} → {end}")
+            return True
+
+        except Exception as e:
+            attempts += 1
+            print(f" Upload failed (Attempt {attempts}/3) for rows {start}–{end}")
+            print("   Error:", e)
+            time.sleep(2)
+
+    print(f" Failed to upload rows {start}–{end} even after 3 retries.")
+    return False
+
+
 def load_data():
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    csv_path = os.path.join(base_dir, "data", "staged", "churn_transformed.csv")
+    staged_path = os.path.join(base_dir, "data", "staged", "churn_transformed.parquet")
 
-    if not os.path.exists(csv_path):
+    if not os.path.exists(staged_path):
         raise FileNotFoundError(" Staged dataset not found! Run transform.py first.")
 
-    df = pd.read_csv(csv_path)
+    # Read only the allowed columns (staged names are mixed-case)
+    staged_cols = pq.read_schema(staged_path).names
+    df = pd.read_parquet(
+        staged_path,
+        engine="pyarrow",
+        columns=[c for c in staged_cols if c.lower() in ALLOWED_COLS]
+    )
 
     # Convert column names → lowercase
     df.columns = df.columns.str.lower()
 
-    # Allowed columns only
-    allowed_cols = [
-        "tenure", "monthlycharges", "totalcharges", "churn",
-        "internetservice", "contract", "paymentmethod",
-        "tenure_group", "monthly_charge_segment",
-        "has_internet_service", "is_multi_line_user",
-        "contract_type_code"
-    ]
-    df = df[allowed_cols]
+    # Allowed columns only (fixed order)
+    df = df[ALLOWED_COLS]
 
-    # Convert NaN → None
-    df = df.replace({np.nan: None})
+    # One COPY round-trip when a direct DB connection is configured
+    if SUPABASE_DB_URL:
+        if copy_to_postgres(df):
+            print(" Upload completed successfully!")
+        return
 
-    data_records = df.to_dict(orient="records")
+    # Arrow turns NaN into null → None while building the records
+    data_records = pa.Table.from_pandas(df, preserve_index=False).to_pylist()
     total_rows = len(data_records)
     batch_size = 200
 
     print(f" Uploading {total_rows} records to Supabase (Batch size = 200)...")
 
-    # Upload in batches
-    for start in range(0, total_rows, batch_size):
-        end = min(start + batch_size, total_rows)
-        batch = data_records[start:end]
+    # Upload batches concurrently; a batch that exhausts its retries
+    # cancels every batch that has not started yet
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as ex:
+        futures = []
+        for start in range(0, total_rows, batch_size):
+            end = min(start + batch_size, total_rows)
+            body = orjson.dumps(data_records[start:end])
+            futures.append(ex.submit(upload_batch, body, start, end))
 
-        attempts = 0
-        uploaded = False
+        failed = False
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            if not future.result() and not failed:
+                failed = True
+                for f in futures:
+                    f.cancel()
 
-        while attempts < 3 and not uploaded:
-            try:
-                supabase.table("churn_data").insert(batch).execute()
-                print(f" Uploaded rows {start} → {end}")
-                uploaded = True
-
-            except Exception as e:
-                attempts += 1
-                print(f" Upload failed (Attempt {attempts}/3) for rows {start}–{end}")
-                print("   Error:", e)
-                time.sleep(2)
-
-        if not uploaded:
-            print(f" Failed to upload rows {start}–{end} even after 3 retries.")
-            break
+    if failed:
+        print(" Upload stopped: remaining batches were cancelled.")
+        return
 
     print(" Upload completed successfully!")
 
 
 # ---------------------------------------------------------
-# 4️ MAIN EXECUTION
+# 5️ MAIN EXECUTION
 # ---------------------------------------------------------
 if __name__ == "__main__":
     create_table()
@@ -34,75 +34,146 @@ Two year      → 2
 Remove:
 customerID, gender
 ✔ Save output to:
-data/staged/churn_transformed.csv
+data/staged/churn_transformed.parquet
 '''
 
 import os
+import numpy as np
 import pandas as pd
-
-def transform_telecom_data(raw_path):
-
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    staged_dir = os.path.join(base_dir, "data", "staged")
-    os.makedirs(staged_dir, exist_ok=True)
-
-    # Load CSV
-    df = pd.read_csv(raw_path)
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows per read_csv chunk (bounds peak memory independent of input size)
+CHUNK_SIZE = 50_000
+
+# Raw columns dropped by the transform are never parsed
+DROP_COLS = {"customerID", "gender"}
+
+# Parse types up front (TotalCharges has blanks, so it stays text until to_numeric)
+RAW_DTYPES = {
+    "MonthlyCharges": "float64",
+    "TotalCharges": "object",
+    "Contract": "category",
+    "MultipleLines": "category",
+    "InternetService": "category",
+    "Churn": "category",
+}
+
+# Fixed bucket edges (open-ended top bin, no per-run max() scan)
+TENURE_BINS = pd.IntervalIndex.from_breaks([-0.001, 12, 36, 60, np.inf])
+TENURE_LABELS = np.array(["New", "Regular", "Loyal", "Champion"])
+
+CHARGE_BINS = pd.IntervalIndex.from_breaks([-0.001, 30, 70, np.inf])
+CHARGE_LABELS = np.array(["Low", "Medium", "High"])
+
+def encode_categorical(series, mapping):
+    # Map each category once, then gather by int codes (unmapped / missing → 0)
+    lut = series.cat.categories.map(mapping).fillna(0).to_numpy(dtype=np.int8)
+    lut = np.append(lut, np.int8(0))  # code -1 (NaN) indexes this slot
+    return lut[series.cat.codes.values]
+
+def transform_chunk(df, medians):
     # CLEANING TASKS
 
     df["TotalCharges"] = pd.to_numeric(df["TotalCharges"], errors="coerce")
 
     numeric_cols = ["tenure", "MonthlyCharges", "TotalCharges"]
-    for col in numeric_cols:
-        df[col] = df[col].fillna(df[col].median())
+    df[numeric_cols] = df[numeric_cols].fillna(medians)
+
+    # Whole months fit in int16; charges stay float64 (float32 would turn
+    # 29.85 into 29.850000381 once the value leaves the DataFrame)
+    df["tenure"] = df["tenure"].astype(np.int16)
 
     cat_cols = df.select_dtypes(include="object").columns
-    for col in cat_cols:
-        df[col] = df[col].fillna("Unknown")
+    df[cat_cols] = df[cat_cols].fillna("Unknown")
+
+    # Columns parsed as category need "Unknown" registered before filling
+    for col in df.select_dtypes(include="category").columns:
+        if df[col].hasnans:
+            df[col] = df[col].cat.add_categories("Unknown").fillna("Unknown")
 
     # FEATURE ENGINEERING
    
-    # 1. tenure_group
-    df["tenure_group"] = pd.cut(
-        df["tenure"],
-        bins=[0, 12, 36, 60, df["tenure"].max()],
-        labels=["New", "Regular", "Loyal", "Champion"],
-        include_lowest=True
+    # 1. tenure_group (int8 bin codes, labelled without materializing strings)
+    df["tenure_group"] = pd.Categorical.from_codes(
+        pd.cut(df["tenure"], TENURE_BINS).cat.codes,
+        categories=TENURE_LABELS,
+        ordered=True
     )
 
     # 2. monthly_charge_segment
-    df["monthly_charge_segment"] = pd.cut(
-        df["MonthlyCharges"],
-        bins=[0, 30, 70, df["MonthlyCharges"].max()],
-        labels=["Low", "Medium", "High"],
-        include_lowest=True
+    df["monthly_charge_segment"] = pd.Categorical.from_codes(
+        pd.cut(df["MonthlyCharges"], CHARGE_BINS).cat.codes,
+        categories=CHARGE_LABELS,
+        ordered=True
     )
 
-    # 3. has_internet_service
-    df["has_internet_service"] = df["InternetService"].map({
+    # 3. has_internet_service (anything other than DSL / Fiber optic → 0)
+    df["InternetService"] = df["InternetService"].astype("category")
+    df["has_internet_service"] = encode_categorical(df["InternetService"], {
         "DSL": 1,
         "Fiber optic": 1,
         "No": 0
-    }).fillna(0)  # ensure no leftover NaN
+    })
 
     # 4. is_multi_line_user
-    df["is_multi_line_user"] = df["MultipleLines"].apply(lambda x: 1 if x == "Yes" else 0)
+    df["is_multi_line_user"] = encode_categorical(
+        df["MultipleLines"].astype("category"), {"Yes": 1}
+    )
 
     # 5. contract_type_code
-    df["contract_type_code"] = df["Contract"].map({
+    df["Contract"] = df["Contract"].astype("category")
+    df["contract_type_code"] = encode_categorical(df["Contract"], {
         "Month-to-month": 0,
         "One year": 1,
         "Two year": 2
-    }).fillna(0)
+    })
 
     # ================================
     # 3️ DROP UNNECESSARY FIELDS
     # ================================
     df.drop(columns=["customerID", "gender"], inplace=True, errors="ignore")
 
-    # Save transformed dataset
-    staged_path = os.path.join(staged_dir, "churn_transformed.csv")
-    df.to_csv(staged_path, index=False)
+    # Low-cardinality text columns → category (stored dictionary-encoded)
+    for col in ["tenure_group", "monthly_charge_segment", "InternetService",
+                "Contract", "PaymentMethod", "Churn"]:
+        df[col] = df[col].astype("category")
+
+    return df
+
+def transform_telecom_data(raw_path):
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    staged_dir = os.path.join(base_dir, "data", "staged")
+    os.makedirs(staged_dir, exist_ok=True)
+
+    # Medians need the whole file, so take them in a numeric-only first pass
+    numeric = pd.read_csv(raw_path, usecols=["tenure", "MonthlyCharges", "TotalCharges"])
+    numeric["TotalCharges"] = pd.to_numeric(numeric["TotalCharges"], errors="coerce")
+    medians = numeric.median()
+    del numeric
+
+    staged_path = os.path.join(staged_dir, "churn_transformed.parquet")
+
+    # Transform CHUNK_SIZE rows at a time, appending each to the Parquet file
+    writer = None
+    try:
+        reader = pd.read_csv(
+            raw_path,
+            usecols=lambda c: c not in DROP_COLS,
+            dtype=RAW_DTYPES,
+            chunksize=CHUNK_SIZE
+        )
+        for chunk in reader:
+            table = pa.Table.from_pandas(transform_chunk(chunk, medians), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(staged_path, table.schema, compression="zstd")
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
 
     print(f" Telecom data transformed and saved at: {staged_path}")
     return staged_path
@@ -9,6 +9,7 @@
 # ============================
 
 import os
+import numpy as np
 import pandas as pd
 from supabase import create_client
 from dotenv import load_dotenv
@@ -21,14 +22,27 @@ def get_supabase_client():
         raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY in .env")
     return create_client(url, key)
 
+def count_csv_rows(path, chunk_size=1 << 20):
+    # Line breaks minus the header, without parsing any fields
+    # (the churn dataset has no newlines inside quoted values)
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    if last != b"\n":
+        lines += 1  # final row without a trailing newline
+    return max(lines - 1, 0)
+
 def validate():
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     raw_path = os.path.join(base_dir, "data", "raw", "churn_raw.csv")
-    staged_path = os.path.join(base_dir, "data", "staged", "churn_transformed.csv")
+    staged_path = os.path.join(base_dir, "data", "staged", "churn_transformed.parquet")
 
     if not os.path.exists(staged_path):
         raise FileNotFoundError(f"Transformed file not found: {staged_path}")
-    df_staged = pd.read_csv(staged_path)
+    df_staged = pd.read_parquet(staged_path, engine="pyarrow")
 
     # 1) No missing values in tenure, MonthlyCharges, TotalCharges (staged)
     missing_info = {
@@ -39,31 +53,21 @@ def validate():
 
     # 2) Unique count of rows = original dataset (raw)
     if os.path.exists(raw_path):
-        df_raw = pd.read_csv(raw_path)
-        raw_unique = df_raw.shape[0]
+        raw_unique = count_csv_rows(raw_path)
     else:
         raw_unique = None
 
     staged_unique = df_staged.shape[0]
-    staged_unique_rows = df_staged.drop_duplicates().shape[0]
+    # Count distinct rows via one uint64 hash per row (no deduped copy)
+    row_hashes = pd.util.hash_pandas_object(df_staged, index=False).to_numpy()
+    staged_unique_rows = np.unique(row_hashes).size
 
-    # 3) Row count in Supabase
+    # 3) Row count in Supabase (count-only HEAD request, no rows transferred)
     supabase = get_supabase_client()
-    try:
-        resp = supabase.table("churn_data").select("*", count="exact").limit(1).execute()
-        supabase_count = None
-        if hasattr(resp, "count") and resp.count is not None:
-            supabase_count = int(resp.count)
-        else:
-            try:
-                supabase_count = int(resp.get("count"))
-            except Exception:
-                all_rows = supabase.table("churn_data").select("*").execute()
-                supabase_count = len(all_rows.data) if hasattr(all_rows, "data") else len(all_rows)
-
-    except Exception as e:
-        print(" Could not fetch count from Supabase:", e)
-        supabase_count = None
+    resp = supabase.table("churn_data").select("id", count="exact", head=True).execute()
+    if getattr(resp, "count", None) is None:
+        raise ValueError("Supabase did not return a row count for churn_data.")
+    supabase_count = int(resp.count)
 
     # 4) All segments exist in staged data
     tenure_groups_present = set(df_staged["tenure_group"].dropna().unique()) if "tenure_group" in df_staged else set()
@@ -73,7 +77,7 @@ def validate():
     required_monthly_segments = {"Low", "Medium", "High"}
 
     # 5) Contract codes only {0,1,2}
-    contract_codes_present = set(df_staged["contract_type_code"].dropna().unique()) if "contract_type_code" in df_staged else set()
+    contract_codes_present = set(df_staged["contract_type_code"].dropna().unique().tolist()) if "contract_type_code" in df_staged else set()
     contract_codes_ok = contract_codes_present.issubset({-1,0,1,2})  
 
     # Print summary